@@ -1,51 +1,342 @@
+import csv
 import os
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import TextIO
+
 import pandas as pd
 
+from consistent_hashing.manager.opened_file_cache import OpenedFileCache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
 
 schema = ["id", "data", "created_at"]
+file_formats = ["csv", "parquet"]
+
+
+def _read_csv(file_path: str) -> pd.DataFrame:
+    # Every column is read as text so ids like "007" survive the round trip.
+    if pa is None:
+        return pd.read_csv(file_path, dtype=str, na_filter=False)
+    # Arrow's CSV reader is multithreaded and parses without creating a
+    # Python object per cell. The writers quote values containing newlines,
+    # so the parser has to allow them inside quotes.
+    convert_options = pa_csv.ConvertOptions(column_types=dict.fromkeys(schema, pa.string()))
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    return pa_csv.read_csv(file_path, parse_options=parse_options, convert_options=convert_options).to_pandas()
+
+
+def _index_rows(index: dict[str, list[tuple[str, ...]]], rows):
+    for row in rows:
+        index.setdefault(row[0], []).append(row)
+
+
+def _close_at_exit(ref: weakref.ref):
+    store = ref()
+    if store is not None:
+        store.close()
 
 class DataStore:
+    def __init__(self, buffer_limit: int = 1, file_format: str = "csv", max_open_files: int = 64):
+        if file_format not in file_formats:
+            raise ValueError(f"Unknown file format {file_format}.")
+        if file_format == "parquet" and pa is None:
+            raise ValueError("The parquet file format requires pyarrow.")
+
+        # Parquet skips text parsing entirely but can't be appended to, so
+        # every flush rewrites the node; pair it with a larger buffer_limit.
+        self._file_format = file_format
+        # Node files live in the working directory the store was created in,
+        # even if the process changes directory before flushing.
+        self._root = os.getcwd()
+        # Rows are staged per node file and appended in one write once
+        # buffer_limit rows have accumulated; 1 keeps inserts write-through.
+        self._buffers: dict[str, list[tuple[str, ...]]] = defaultdict(list)
+        self._buffer_limit = buffer_limit
+        # Deletes apply to the cached table straight away; the node file is
+        # compacted once buffer_limit of them are pending for it. Each id maps
+        # to how many of its rows, counted from the top of the file, are
+        # deleted; rows re-inserted later come after those and are kept.
+        self._pending_deletes: dict[str, dict[str, int]] = {}
+        # Last known contents of each node file, kept in step with every
+        # write so reads don't have to re-parse the CSV. Appended frames
+        # wait in _tails and are concatenated once, on the next read.
+        self._tables: dict[str, pd.DataFrame] = {}
+        # (inode, size, mtime) of each node file as the cached table last
+        # saw it. Another writer changing the file shows up as a mismatch.
+        self._stamps: dict[str, tuple[int, int, int] | None] = {}
+        self._tails: dict[str, list[pd.DataFrame | list[tuple[str, ...]]]] = {}
+        # id -> rows of each node file. Built once per node and then kept in
+        # step by every write, so lookups never touch the table.
+        self._indexes: dict[str, dict[str, list[tuple[str, ...]]]] = {}
+        # Append handles and lock files stay open between writes instead of
+        # being reopened for every batch. Together they are capped at
+        # max_open_files, closing the least recently used one. A write holds
+        # its node's lock while fetching the append handle, so two slots are
+        # the minimum that never evicts a held lock.
+        if max_open_files < 2:
+            raise ValueError("max_open_files must be at least 2.")
+        self._handles = OpenedFileCache(max_open_files)
+        # Flushes staged rows at exit without keeping the store alive until
+        # then; a store collected earlier flushes from __del__ instead.
+        weakref.finalize(self, _close_at_exit, weakref.ref(self))
+
+    def __del__(self):
+        if hasattr(self, "_handles"):
+            self.close()
+
     def _get_node_config(self, node_name: str) -> str:
-        return node_name if node_name.endswith(".csv") else f"{node_name}.csv"
+        extension = f".{self._file_format}"
+        file_name = node_name if node_name.endswith(extension) else f"{node_name}{extension}"
+        return os.path.join(self._root, file_name)
 
     def create_node(self, node_name: str):
         file_path = self._get_node_config(node_name)
-        df = pd.DataFrame(columns=schema)
-        df.to_csv(file_path, index=False)
+        self._buffers.pop(file_path, None)
+        self._atomic_write(file_path, pd.DataFrame(columns=schema))
 
     def delete_node(self, node_name: str):
         file_path = self._get_node_config(node_name)
+        self._buffers.pop(file_path, None)
+        self._pending_deletes.pop(file_path, None)
+        self._drop_cache(file_path)
+        self._handles.close(file_path)
+        self._handles.close(f"{file_path}.lock")
+        for path in (file_path, f"{file_path}.lock"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _stamp(self, file_path: str) -> tuple[int, int, int] | None:
         try:
-            os.remove(file_path)
+            st = os.stat(file_path)
         except FileNotFoundError:
             return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _drop_cache(self, file_path: str):
+        self._tables.pop(file_path, None)
+        self._stamps.pop(file_path, None)
+        self._tails.pop(file_path, None)
+        self._indexes.pop(file_path, None)
+
+    def _drop_if_stale(self, file_path: str):
+        # Called with the node locked, before anything is written from the
+        # cached table, so rows other writers added are never overwritten.
+        stamp = self._stamp(file_path)
+        if file_path in self._stamps and self._stamps[file_path] != stamp:
+            self._drop_cache(file_path)
+        # Another writer's os.replace leaves our append handle on the old inode.
+        if file_path in self._handles:
+            if stamp is None or os.fstat(self._handles.get(file_path).fileno()).st_ino != stamp[0]:
+                self._handles.close(file_path)
+
+    def _load(self, file_path: str) -> pd.DataFrame:
+        df = self._tables.get(file_path)
+        if df is None:
+            # Stamped before reading: a write landing in between makes the
+            # stamp look stale, which only costs a reread.
+            self._stamps[file_path] = self._stamp(file_path)
+            df = _read_csv(file_path) if self._file_format == "csv" else pd.read_parquet(file_path)
+            pending = self._pending_deletes.get(file_path)
+            if pending:
+                # The file still holds rows deleted since the last compaction.
+                deleted = df.groupby('id', sort=False).cumcount() < df['id'].map(pending)
+                df = df[~deleted].reset_index(drop=True)
+        tail = self._tails.pop(file_path, None)
+        if tail:
+            tail = [t if isinstance(t, pd.DataFrame) else pd.DataFrame.from_records(t, columns=schema) for t in tail]
+            df = pd.concat([df, *tail] if len(df) else tail, ignore_index=True)
+        self._tables[file_path] = df
+        return df
+
+    def _index(self, file_path: str) -> dict[str, list[tuple[str, ...]]]:
+        index = self._indexes.get(file_path)
+        if index is None:
+            df = self._load(file_path)
+            index = {}
+            _index_rows(index, zip(*(df[column].tolist() for column in schema)))
+            self._indexes[file_path] = index
+        return index
+
+    @contextmanager
+    def _locked(self, file_path: str):
+        # Writers in other processes take the same lock. It lives in a side
+        # file because _atomic_write swaps the node file's inode.
+        if fcntl is None:
+            yield
+            return
+        lock = self._handles.get(f"{file_path}.lock")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _append(self, file_path: str, df: pd.DataFrame):
+        if self._file_format == "parquet":
+            with self._locked(file_path):
+                self._drop_if_stale(file_path)
+                table = df
+                if os.path.exists(file_path) and len(existing := self._load(file_path)):
+                    table = pd.concat([existing, df], ignore_index=True)
+                self._replace_file(file_path, table, keep_index=True)
+        else:
+            with self._locked(file_path):
+                self._drop_if_stale(file_path)
+                handle = self._handles.get(file_path)
+                df.to_csv(handle, header=handle.tell() == 0, index=False)
+                # Hands the batch to the OS so other readers see it; nothing
+                # is fsynced here, that is left to sync().
+                handle.flush()
+                self._restamp(file_path, handle)
+            if file_path in self._tables:
+                self._tails.setdefault(file_path, []).append(df)
+        if file_path in self._indexes:
+            _index_rows(self._indexes[file_path], zip(*(df[column].tolist() for column in schema)))
+
+    def _append_rows(self, file_path: str, rows: list[tuple[str, ...]]):
+        with self._locked(file_path):
+            self._drop_if_stale(file_path)
+            handle = self._handles.get(file_path)
+            # Same dialect pandas' to_csv writes, so both can share the file.
+            writer = csv.writer(handle, lineterminator="\n")
+            if handle.tell() == 0:
+                writer.writerow(schema)
+            writer.writerows(rows)
+            handle.flush()
+            self._restamp(file_path, handle)
+        if file_path in self._tables:
+            self._tails.setdefault(file_path, []).append(rows)
+        if file_path in self._indexes:
+            _index_rows(self._indexes[file_path], rows)
+
+    def _restamp(self, file_path: str, handle: TextIO):
+        # Our own append keeps a still-valid cache valid.
+        if file_path in self._stamps:
+            st = os.fstat(handle.fileno())
+            self._stamps[file_path] = st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _atomic_write(self, file_path: str, df: pd.DataFrame, keep_index: bool = False):
+        with self._locked(file_path):
+            self._replace_file(file_path, df, keep_index)
+
+    def _replace_file(self, file_path: str, df: pd.DataFrame, keep_index: bool = False):
+        # Callers hold the node lock. os.replace is atomic within a
+        # filesystem on POSIX, so a crash mid-write leaves the previous file
+        # intact rather than a truncated one.
+        tmp_path = f"{file_path}.tmp"
+        # The append handle would keep pointing at the replaced file.
+        self._handles.close(file_path)
+        if self._file_format == "csv":
+            df.to_csv(tmp_path, index=False)
+        else:
+            df.astype(str).to_parquet(tmp_path, engine="pyarrow", compression=None, index=False)
+        os.replace(tmp_path, file_path)
+        self._stamps[file_path] = self._stamp(file_path)
+        self._tables[file_path] = df.reset_index(drop=True)
+        self._tails.pop(file_path, None)
+        if not keep_index:
+            self._indexes.pop(file_path, None)
+        self._pending_deletes.pop(file_path, None)
+
+    def _flush_rows(self, file_path: str):
+        rows = self._buffers.pop(file_path, None)
+        if not rows:
+            return
+        if self._file_format == "csv":
+            self._append_rows(file_path, rows)
+        else:
+            self._append(file_path, pd.DataFrame.from_records(rows, columns=schema))
+
+    def flush(self, node_name: str):
+        file_path = self._get_node_config(node_name)
+        self._flush_rows(file_path)
+        if file_path in self._pending_deletes:
+            with self._locked(file_path):
+                self._drop_if_stale(file_path)
+                self._replace_file(file_path, self._load(file_path), keep_index=True)
+
+    def flush_all(self):
+        for file_path in set(self._buffers) | set(self._pending_deletes):
+            self.flush(file_path)
+
+    def sync(self):
+        self.flush_all()
+        for file_path in set(self._tables) | set(self._handles):
+            if file_path.endswith(".lock") or not os.path.exists(file_path):
+                continue
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def close(self):
+        self.flush_all()
+        self._handles.close_all()
 
     def get_all(self, node_name: str) -> pd.DataFrame:
         file_path = self._get_node_config(node_name)
+        self._flush_rows(file_path)
         try:
-            df = pd.read_csv(file_path)
+            df = self._load(file_path)
         except FileNotFoundError:
             df = pd.DataFrame(columns=schema)
-        return df
+        return df.copy(deep=False)
 
     def get_by_id(self, id: str, node_name: str):
         file_path = self._get_node_config(node_name)
-        df = pd.read_csv(file_path)
-        result = df[df['id'] == id]
-        return result
+        rows = self._index(file_path).get(id, [])
+        staged = [row for row in self._buffers.get(file_path, ()) if row[0] == id]
+        return pd.DataFrame.from_records(rows + staged, columns=schema)
 
     def insert(self, data: list[str], node_name: str):
         if len(data) != len(schema):
             raise ValueError(f"Data length {len(data)} does not match schema length {len(schema)}.")
 
         file_path = self._get_node_config(node_name)
-        df = pd.read_csv(file_path)
-        new_row = pd.DataFrame([data], columns=schema)
-        df = pd.concat([df, new_row], ignore_index=True)
-        df.to_csv(file_path, index=False)
+        rows = self._buffers[file_path]
+        rows.append(tuple(data))
+        if len(rows) >= self._buffer_limit:
+            self._flush_rows(file_path)
+
+    def insert_many(self, df: pd.DataFrame, node_name: str):
+        file_path = self._get_node_config(node_name)
+        self._flush_rows(file_path)
+        self._append(file_path, df[schema])
+
+    def replace(self, df: pd.DataFrame, node_name: str):
+        file_path = self._get_node_config(node_name)
+        self._buffers.pop(file_path, None)
+        self._atomic_write(file_path, df[schema])
 
     def delete_by_id(self, id: str, node_name: str):
         file_path = self._get_node_config(node_name)
-        df = pd.read_csv(file_path)
-        df = df[df['id'] != id]
-        df.to_csv(file_path, index=False)
+        self._flush_rows(file_path)
+        with self._locked(file_path):
+            self._drop_if_stale(file_path)
+            index = self._index(file_path)
+            rows = index.pop(id, None)
+            if rows is None:
+                return
+            df = self._load(file_path)
+            df = df[df['id'] != id].reset_index(drop=True)
+            pending = self._pending_deletes.setdefault(file_path, {})
+            pending[id] = pending.get(id, 0) + len(rows)
+            if len(pending) >= self._buffer_limit:
+                self._replace_file(file_path, df, keep_index=True)
+                return
+            self._tables[file_path] = df
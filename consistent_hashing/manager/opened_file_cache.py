@@ -0,0 +1,41 @@
+from collections import OrderedDict
+from typing import TextIO
+
+
+class OpenedFileCache:
+    def __init__(self, capacity: int = 64):
+        if capacity < 1:
+            raise ValueError("OpenedFileCache capacity must be at least 1.")
+        self._capacity = capacity
+        # Least recently used first.
+        self._files: OrderedDict[str, TextIO] = OrderedDict()
+
+    def get(self, file_path: str) -> TextIO:
+        handle = self._files.get(file_path)
+        if handle is not None:
+            self._files.move_to_end(file_path)
+            return handle
+        handle = self._files[file_path] = open(file_path, "a", newline="", buffering=1 << 16)
+        if len(self._files) > self._capacity:
+            _, evicted = self._files.popitem(last=False)
+            evicted.close()
+        return handle
+
+    def close(self, file_path: str):
+        handle = self._files.pop(file_path, None)
+        if handle is not None:
+            handle.close()
+
+    def close_all(self):
+        while self._files:
+            _, handle = self._files.popitem(last=False)
+            handle.close()
+
+    def __contains__(self, file_path: str) -> bool:
+        return file_path in self._files
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self) -> int:
+        return len(self._files)
@@ -1,96 +1,276 @@
 import bisect
 import hashlib
+from collections.abc import Iterable
+from functools import lru_cache
+from itertools import chain
+
+import numpy as np
+import pandas as pd
 
 from consistent_hashing.manager.data_store import DataStore
+from consistent_hashing.manager.shared_ring import SharedRing
 from consistent_hashing.manager.visualization import Visualization
 
+algorithms = ["ring", "jump", "rendezvous"]
+
+
+def jump_hash(key: int, num_buckets: int) -> int:
+    # Lamping & Veach, "A Fast, Minimal Memory, Consistent Hash Algorithm".
+    bucket, j = -1, 0
+    while j < num_buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def jump_hash_many(keys: np.ndarray, num_buckets: int) -> np.ndarray:
+    keys = keys.astype(np.uint64)
+    buckets = np.full(keys.shape, -1, dtype=np.int64)
+    j = np.zeros(keys.shape, dtype=np.int64)
+    active = np.arange(keys.size)
+    while active.size:
+        buckets[active] = j[active]
+        keys[active] = keys[active] * np.uint64(2862933555777941757) + np.uint64(1)
+        step = (1 << 31) / ((keys[active] >> np.uint64(33)) + np.uint64(1)).astype(np.float64)
+        j[active] = ((buckets[active] + 1) * step).astype(np.int64)
+        active = active[j[active] < num_buckets]
+    return buckets
+
+
+def _mix64(x: int) -> int:
+    # splitmix64 finalizer
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return x ^ (x >> 31)
+
+
+def _mix64_many(x: np.ndarray) -> np.ndarray:
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def rendezvous_hash(key: int, seeds: list[int]) -> int:
+    # Highest random weight: the node whose seed scores highest with the key wins.
+    return max(range(len(seeds)), key=lambda i: _mix64(key ^ seeds[i]))
+
+
+def rendezvous_hash_many(keys: np.ndarray, seeds: np.ndarray) -> np.ndarray:
+    scores = _mix64_many(keys.astype(np.uint64)[:, None] ^ seeds[None, :])
+    return scores.argmax(axis=1)
+
 
 class ShardManager:
-    def __init__(self, max_limit=2**32, virtual_nodes=150):
+    def __init__(self, max_limit=2**32, virtual_nodes=150, buffer_limit=1, algorithm="ring", share_ring=False,
+                 file_format="csv"):
+        if algorithm not in algorithms:
+            raise ValueError(f"Unknown algorithm {algorithm}.")
+        if share_ring and algorithm != "ring":
+            raise ValueError("Only the ring algorithm can be shared.")
+
+        self.algorithm = algorithm
+        # Physical nodes; with jump hashing the position is the bucket number.
+        self._nodes: list[str] = []
         self.shards_to_idx: dict[str, int] = {}
         self.virtual_to_physical: dict[str, str] = {}
+        self._virtual_entries: dict[str, list[tuple[int, str]]] = {}
         self.max_limit = max_limit
         self.virtual_nodes = virtual_nodes
-        self.data_store = DataStore()
+        # Power-of-two ring sizes reduce hashes with a mask instead of a
+        # modulo, and the default 2**32 ring fits in uint32.
+        self._hash_mask = max_limit - 1 if max_limit & (max_limit - 1) == 0 else None
+        self._hash_dtype = np.uint32 if max_limit <= 1 << 32 else np.uint64
+        # Worker processes can route against the published ring through
+        # SharedRingReader(shared_ring.name) without copying it.
+        self.shared_ring = SharedRing() if share_ring else None
+        self._rebuild_ring()
+        self.data_store = DataStore(buffer_limit=buffer_limit, file_format=file_format)
         self.viz = Visualization()
 
     def _hash(self, data: str) -> int:
-        h = hashlib.sha256(data.encode("utf-8")).hexdigest()
-        return int(h, 16) % self.max_limit
+        h = int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "big")
+        return h & self._hash_mask if self._hash_mask is not None else h % self.max_limit
+
+    def _hash_many(self, ids: Iterable[str]) -> np.ndarray:
+        # Same values as _hash, but the digests are decoded and reduced in
+        # one NumPy pass instead of an int.from_bytes and modulo per id.
+        blake2b = hashlib.blake2b
+        digests = b"".join([blake2b(i.encode("utf-8"), digest_size=8).digest() for i in ids])
+        hashes = np.frombuffer(digests, dtype=">u8")
+        if self._hash_mask is not None:
+            hashes = hashes & np.uint64(min(self._hash_mask, 2**64 - 1))
+        elif self.max_limit < 1 << 64:
+            hashes = hashes % np.uint64(self.max_limit)
+        return hashes.astype(self._hash_dtype)
 
     def _find_node_for_hash(self, hash_val: int) -> str:
-        if not self.shards_to_idx:
+        if not self._nodes:
             raise ValueError("No nodes available in cluster")
 
-        sorted_items = sorted(self.shards_to_idx.items(), key=lambda x: x[1])
-        hashes = [h for _, h in sorted_items]
-        idx = bisect.bisect_right(hashes, hash_val)
-        virtual_node = sorted_items[idx % len(sorted_items)][0]
-        return self.virtual_to_physical.get(virtual_node, virtual_node) 
+        if self.algorithm == "jump":
+            return self._nodes[jump_hash(hash_val, len(self._nodes))]
+        if self.algorithm == "rendezvous":
+            return self._nodes[rendezvous_hash(hash_val, self._node_seeds)]
+
+        # With virtual_nodes=0 the ring stays empty even once nodes exist.
+        if not self._ring_hash_list:
+            raise ValueError("No nodes available in cluster")
+        return self._ring_nodes[bisect.bisect_right(self._ring_hash_list, hash_val)]
+
+    def _find_node_positions_for_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        # Positions in self._nodes rather than names, so callers can compare
+        # and group owners as integers.
+        if not self._nodes:
+            raise ValueError("No nodes available in cluster")
+
+        if self.algorithm == "jump":
+            return jump_hash_many(hashes, len(self._nodes))
+        if self.algorithm == "rendezvous":
+            return rendezvous_hash_many(hashes, self._node_seed_array)
+
+        if not self._ring_hash_list:
+            raise ValueError("No nodes available in cluster")
+        return self._ring_owners[np.searchsorted(self._ring_hashes, hashes, side="right")]
+
+    def _find_nodes_for_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        return self._node_array[self._find_node_positions_for_hashes(hashes)]
+
+    def _rebuild_ring(self):
+        # Only membership changes rebuild the ring, so it is sorted afresh
+        # here rather than kept in a sorted container.
+        ring = sorted(chain.from_iterable(self._virtual_entries.values()))
+        hashes = [h for h, _ in ring]
+        vnodes = [v for _, v in ring]
+        # The first virtual node is repeated past the end, so a hash beyond
+        # the last slot wraps around without a modulo.
+        vnodes.extend(vnodes[:1])
+        # Single lookups bisect plain lists, which is several times cheaper
+        # than a NumPy call on one value; the arrays serve bulk routing.
+        self._ring_hash_list = hashes
+        self._ring_nodes = [self.virtual_to_physical[v] for v in vnodes]
+        self._ring_hashes = np.array(hashes, dtype=self._hash_dtype)
+        positions = {n: i for i, n in enumerate(self._nodes)}
+        self._ring_owners = np.array([positions[n] for n in self._ring_nodes], dtype=np.int32)
+        self._node_array = np.array(self._nodes, dtype=object)
+        self._node_seeds = [self._hash(n) for n in self._nodes]
+        self._node_seed_array = np.array(self._node_seeds, dtype=np.uint64)
+        if self.shared_ring is not None and self._nodes:
+            self.shared_ring.publish(self._ring_hashes, self._ring_owners, self._nodes)
+        # Routes only change when the ring does, so a fresh cache per
+        # rebuild can never hand out a stale node.
+        self._find_node_for_key = lru_cache(maxsize=1 << 16)(self._route_key)
+
+    def _route_key(self, key: str) -> str:
+        return self._find_node_for_hash(self._hash(key))
 
     def get_data(self, id: str):
-        node_name = self._find_node_for_hash(self._hash(id))
+        node_name = self._find_node_for_key(id)
         return self.data_store.get_by_id(id, node_name)
 
     def insert_data(self, data: list[str]):
         id = data[0]
-        node_name = self._find_node_for_hash(self._hash(id))
+        node_name = self._find_node_for_key(id)
         self.data_store.insert(data, node_name)
 
     def delete_data(self, id: str):
-        node_name = self._find_node_for_hash(self._hash(id))
+        node_name = self._find_node_for_key(id)
         self.data_store.delete_by_id(id, node_name)
 
+    def _rebalance_bulk(self, affected_nodes: list[str]):
+        # Reads every affected node once and writes every node it touches once.
+        frames = {n: df for n in affected_nodes if len(df := self.data_store.get_all(n))}
+        if not frames:
+            return
+        all_data = pd.concat(frames.values(), ignore_index=True)
+        # Owners are handled as positions in self._nodes; a node that is
+        # being removed has none and gets -1.
+        positions = {n: i for i, n in enumerate(self._nodes)}
+        origins = np.repeat([positions.get(n, -1) for n in frames], [len(df) for df in frames.values()])
+        targets = self._find_node_positions_for_hashes(self._hash_many(all_data['id'].to_numpy()))
+        moved = targets != origins
+        if not moved.any():
+            return
+
+        incoming = dict(tuple(all_data[moved].groupby(targets[moved], sort=False)))
+        for source in np.unique(origins[moved]).tolist():
+            if source < 0:
+                # A node being removed is deleted right after, so only its
+                # destinations need writing.
+                continue
+            kept = all_data[(origins == source) & ~moved]
+            if source in incoming:
+                kept = pd.concat([kept, incoming.pop(source)], ignore_index=True)
+            self.data_store.replace(kept, self._nodes[source])
+        for target, group in incoming.items():
+            self.data_store.insert_many(group, self._nodes[target])
+
     def _rebalance_data_on_node_addition(self, node_name):
-        existing_nodes = [p for p in set(self.virtual_to_physical.values()) if p != node_name]        
-        for existing_node in existing_nodes:
-            all_data = self.data_store.get_all(existing_node)
-            for item in all_data.values.tolist():
-                item_id = item[0]
-                correct_node = self._find_node_for_hash(self._hash(item_id))
-                if correct_node == node_name:
-                    self.data_store.insert(item, node_name)
-                    self.data_store.delete_by_id(item_id, existing_node)
-
-    def _rebalance_data_on_node_removal(self, node_name):
-        all_data = self.data_store.get_all(node_name)
-        next_node = self._find_node_for_hash((self._hash(node_name) + 1) % self.max_limit)
-        for item in all_data.values.tolist():
-            self.data_store.insert(item, next_node)
-            self.data_store.delete_by_id(item[0], node_name)
+        self._rebalance_bulk([p for p in self._nodes if p != node_name])
+
+    def _rebalance_data_on_node_removal(self, node_name, relocated):
+        affected_nodes = [node_name]
+        if self.algorithm == "jump" and relocated != node_name:
+            affected_nodes.append(relocated)
+        self._rebalance_bulk(affected_nodes)
 
     def add_node(self, node_name: str):
-        if node_name in self.virtual_to_physical.values():
+        if node_name in self._nodes:
             raise ValueError(f"Node {node_name} already exists.")
-        
-        for i in range(self.virtual_nodes):
-            virtual_name = f"{node_name}#v{i}"
-            virtual_hash = self._hash(virtual_name)
-            self.shards_to_idx[virtual_name] = virtual_hash
-            self.virtual_to_physical[virtual_name] = node_name
+
+        self._nodes.append(node_name)
+        if self.algorithm == "ring":
+            virtual_names = [f"{node_name}#v{i}" for i in range(self.virtual_nodes)]
+            entries = list(zip(self._hash_many(virtual_names).tolist(), virtual_names))
+            for virtual_hash, virtual_name in entries:
+                self.shards_to_idx[virtual_name] = virtual_hash
+                self.virtual_to_physical[virtual_name] = node_name
+            self._virtual_entries[node_name] = entries
+        self._rebuild_ring()
 
         self.data_store.create_node(node_name)
         self.visualize_ring()
         self._rebalance_data_on_node_addition(node_name)
 
     def remove_node(self, node_name: str):
-        virtual_nodes = [v for v, p in self.virtual_to_physical.items() if p == node_name]
-        if not virtual_nodes:
+        if node_name not in self._nodes:
             raise ValueError(f"Node {node_name} does not exist.")
-        
-        if len(set(self.virtual_to_physical.values())) == 1:
+
+        if len(self._nodes) == 1:
             raise ValueError("Cannot remove the last node in the cluster.")
 
-        for v_node in virtual_nodes:
-            del self.shards_to_idx[v_node]
-            del self.virtual_to_physical[v_node]
+        # The last node takes over the removed node's position. Under jump
+        # hashing that moves it to a new bucket, so its keys need re-routing.
+        idx = self._nodes.index(node_name)
+        relocated = self._nodes.pop()
+        if relocated != node_name:
+            self._nodes[idx] = relocated
 
-        self._rebalance_data_on_node_removal(node_name)
+        for _, virtual_name in self._virtual_entries.pop(node_name, ()):
+            del self.shards_to_idx[virtual_name]
+            del self.virtual_to_physical[virtual_name]
+        self._rebuild_ring()
+
+        self._rebalance_data_on_node_removal(node_name, relocated)
         self.data_store.delete_node(node_name)
         self.visualize_ring()
 
+    def flush(self):
+        self.data_store.flush_all()
+
+    def sync(self):
+        self.data_store.sync()
+
+    def close(self):
+        self.data_store.close()
+        if self.shared_ring is not None:
+            self.shared_ring.close()
+            self.shared_ring = None
+
     def visualize_ring(self):
+        if self.algorithm != "ring":
+            return
         self.viz.visualize_ring(self.shards_to_idx)
 
     def visualize_distribution(self):
-        self.viz.visualize_distribution(self.shards_to_idx, self.data_store)
+        self.viz.visualize_distribution(self._nodes, self.data_store)
@@ -0,0 +1,164 @@
+import inspect
+import json
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Control block layout: [version, data block name length] as uint64, then the
+# name bytes. An odd version means a publish is in progress.
+_CONTROL_HEADER = 16
+_CONTROL_SIZE = _CONTROL_HEADER + 256
+
+# Data block layout: [slot count, names length] as uint64, the ring hashes as
+# uint64, one int32 node index per slot plus the wrap-around slot, then the
+# node names as JSON.
+_DATA_HEADER = 16
+
+
+# How long a reader waits on a publish that never completes, e.g. because
+# the publisher died halfway through one.
+_REFRESH_TIMEOUT = 5.0
+
+_HAS_TRACK = "track" in inspect.signature(shared_memory.SharedMemory).parameters
+
+
+def _data_layout(n: int) -> tuple[int, int]:
+    owners_at = _DATA_HEADER + 8 * n
+    names_at = owners_at + 4 * (n + 1)
+    return owners_at, names_at
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Readers only borrow the publisher's blocks. Left registered, a reader
+    # process's resource tracker would unlink them when that process exits.
+    if _HAS_TRACK:
+        return shared_memory.SharedMemory(name=name, track=False)
+    block = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+def _unlink(block: shared_memory.SharedMemory):
+    # A reader sharing this process's tracker may have unregistered the block
+    # in _attach. Registering is idempotent, so unlink's unregister always
+    # finds it.
+    if not _HAS_TRACK:
+        resource_tracker.register(block._name, "shared_memory")
+    block.unlink()
+
+
+class SharedRing:
+    def __init__(self):
+        self._control = shared_memory.SharedMemory(create=True, size=_CONTROL_SIZE)
+        self._header = np.ndarray(2, dtype=np.uint64, buffer=self._control.buf)
+        self._header[:] = 0
+        self._block: shared_memory.SharedMemory | None = None
+
+    @property
+    def name(self) -> str:
+        return self._control.name
+
+    def publish(self, hashes: np.ndarray, owners: np.ndarray, nodes: list[str]):
+        n = hashes.size
+        names = json.dumps(nodes).encode("utf-8")
+        owners_at, names_at = _data_layout(n)
+        block = shared_memory.SharedMemory(create=True, size=names_at + len(names))
+        np.ndarray(2, dtype=np.uint64, buffer=block.buf)[:] = (n, len(names))
+        np.ndarray(n, dtype=np.uint64, buffer=block.buf, offset=_DATA_HEADER)[:] = hashes
+        np.ndarray(n + 1, dtype=np.int32, buffer=block.buf, offset=owners_at)[:] = owners
+        block.buf[names_at:names_at + len(names)] = names
+
+        block_name = block.name.encode("utf-8")
+        self._header[0] += 1
+        self._header[1] = len(block_name)
+        self._control.buf[_CONTROL_HEADER:_CONTROL_HEADER + len(block_name)] = block_name
+        self._header[0] += 1
+
+        # Readers that already mapped the old block keep their mapping.
+        self._release_block()
+        self._block = block
+
+    def _release_block(self):
+        if self._block is not None:
+            self._block.close()
+            _unlink(self._block)
+            self._block = None
+
+    def close(self):
+        self._release_block()
+        self._header = None
+        self._control.close()
+        _unlink(self._control)
+
+
+class SharedRingReader:
+    def __init__(self, name: str):
+        self._control = _attach(name)
+        self._header = np.ndarray(2, dtype=np.uint64, buffer=self._control.buf)
+        self._block: shared_memory.SharedMemory | None = None
+        self.version = 0
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self._owners = np.empty(0, dtype=np.int32)
+        self._nodes = np.empty(0, dtype=object)
+
+    def _refresh(self):
+        deadline = None
+        delay = 1e-6
+        while True:
+            version = int(self._header[0])
+            if version == self.version:
+                return
+            if version % 2 == 0:
+                name_len = int(self._header[1])
+                block_name = bytes(self._control.buf[_CONTROL_HEADER:_CONTROL_HEADER + name_len]).decode("utf-8")
+                if int(self._header[0]) == version:
+                    try:
+                        block = _attach(block_name)
+                    except FileNotFoundError:
+                        # Superseded by a newer publish while we were reading.
+                        pass
+                    else:
+                        self._map(block)
+                        self.version = version
+                        return
+            # A publish is in flight; back off instead of spinning, and give
+            # up if it never finishes.
+            if deadline is None:
+                deadline = time.monotonic() + _REFRESH_TIMEOUT
+            elif time.monotonic() > deadline:
+                raise TimeoutError("Shared ring publish did not complete.")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.01)
+
+    def _map(self, block: shared_memory.SharedMemory):
+        n, names_len = (int(v) for v in np.ndarray(2, dtype=np.uint64, buffer=block.buf))
+        owners_at, names_at = _data_layout(n)
+        self._hashes = np.ndarray(n, dtype=np.uint64, buffer=block.buf, offset=_DATA_HEADER)
+        self._owners = np.ndarray(n + 1, dtype=np.int32, buffer=block.buf, offset=owners_at)
+        nodes = json.loads(bytes(block.buf[names_at:names_at + names_len]).decode("utf-8"))
+        self._nodes = np.array(nodes, dtype=object)
+        if self._block is not None:
+            self._block.close()
+        self._block = block
+
+    def find_node_for_hash(self, hash_val: int) -> str:
+        self._refresh()
+        if not self._hashes.size:
+            raise ValueError("No nodes available in cluster")
+        idx = np.searchsorted(self._hashes, np.uint64(hash_val), side="right")
+        return self._nodes[self._owners[idx]]
+
+    def find_nodes_for_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        self._refresh()
+        if not self._hashes.size:
+            raise ValueError("No nodes available in cluster")
+        idx = np.searchsorted(self._hashes, hashes.astype(np.uint64), side="right")
+        return self._nodes[self._owners[idx]]
+
+    def close(self):
+        self._hashes = self._owners = self._header = None
+        if self._block is not None:
+            self._block.close()
+            self._block = None
+        self._control.close()
@@ -2,26 +2,34 @@ import logging
 
 from consistent_hashing.manager.data_store import DataStore
 
+_log = logging.getLogger(__name__)
+
 
 class Visualization:
     def visualize_ring(self, shards_to_idx: dict[str, int]):
+        # Sorting and formatting every virtual node is wasted work when
+        # nobody is listening, and add_node/remove_node call this each time.
+        if not _log.isEnabledFor(logging.INFO):
+            return
         if not shards_to_idx:
-            logging.info("Ring is empty.")
+            _log.info("Ring is empty.")
             return
         items = sorted((h, n) for n, h in shards_to_idx.items())
         lines = ["Ring (clockwise):"]
         for h, n in items:
             lines.append(f"  - hash={h:5d} -> node={n}")
-        logging.info("\n" + "\n".join(lines))
+        _log.info("\n" + "\n".join(lines))
 
-    def visualize_distribution(self, shards_to_idx: dict[str, int], data_store: DataStore, show_samples: int = 3):
-        if not shards_to_idx:
-            logging.info("No nodes to show distribution for.")
+    def visualize_distribution(self, nodes: list[str], data_store: DataStore, show_samples: int = 3):
+        if not _log.isEnabledFor(logging.INFO):
+            return
+        if not nodes:
+            _log.info("No nodes to show distribution for.")
             return
         lines = ["Distribution:"]
-        for node in sorted(shards_to_idx):
+        for node in sorted(nodes):
             df = data_store.get_all(node)
             count = len(df)
-            samples = df['id'].tolist()[:show_samples] if count else []
+            samples = df['id'].head(show_samples).tolist()
             lines.append(f"  - node={node} count={count} samples={samples}")
-        logging.info("\n" + "\n".join(lines))
+        _log.info("\n" + "\n".join(lines))
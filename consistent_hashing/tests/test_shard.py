@@ -1,8 +1,24 @@
+import gc
+import logging
 import os
+import subprocess
+import sys
+import weakref
+import numpy as np
 import pandas as pd
 import pytest
 
-from consistent_hashing.manager.shard_manager import ShardManager
+from consistent_hashing.manager.data_store import DataStore
+from consistent_hashing.manager.opened_file_cache import OpenedFileCache
+from consistent_hashing.manager import shared_ring
+from consistent_hashing.manager.shared_ring import SharedRingReader
+from consistent_hashing.manager.shard_manager import (
+    ShardManager,
+    jump_hash,
+    jump_hash_many,
+    rendezvous_hash,
+    rendezvous_hash_many,
+)
 
 @pytest.fixture(autouse=True)
 def chdir_tmp_path(tmp_path, monkeypatch):
@@ -48,6 +64,51 @@ def test_remove_node_deletes_shard():
     assert "NodeA" not in m.virtual_to_physical.values()
     assert not os.path.exists("NodeA.csv")
 
+def test_append_handle_reused_and_reopened_after_rewrite():
+    m = ShardManager()
+    m.add_node("NodeA")
+
+    m.insert_data(["id1", "payload1", "2025-01-01"])
+    handle = m.data_store._handles.get(m.data_store._get_node_config("NodeA"))
+    m.insert_data(["id2", "payload2", "2025-01-01"])
+    assert m.data_store._handles.get(m.data_store._get_node_config("NodeA")) is handle
+
+    m.delete_data("id1")
+    assert handle.closed
+    m.insert_data(["id3", "payload3", "2025-01-01"])
+    m.sync()
+    assert read_ids_for_node("NodeA") == ["id2", "id3"]
+
+    m.close()
+    assert len(m.data_store._handles) == 0
+
+def test_buffered_deletes_compact_on_flush():
+    m = ShardManager(buffer_limit=3)
+    m.add_node("NodeA")
+    for i in range(3):
+        m.insert_data([f"id{i}", f"payload{i}", "2025-01-01"])
+
+    m.delete_data("id0")
+    m.delete_data("id1")
+    assert len(m.get_data("id0")) == 0
+    assert read_ids_for_node("NodeA") == ["id0", "id1", "id2"]
+
+    m.insert_data(["id3", "payload3", "2025-01-01"])
+    m.flush()
+    assert read_ids_for_node("NodeA") == ["id2", "id3"]
+
+def test_node_writes_leave_no_side_files():
+    m = ShardManager()
+    m.add_node("NodeA")
+    m.add_node("NodeB")
+    for i in range(20):
+        m.insert_data([f"id{i}", f"payload{i}", "2025-01-01"])
+    m.delete_data("id0")
+    m.remove_node("NodeA")
+
+    assert sorted(f for f in os.listdir() if f.startswith("NodeA")) == []
+    assert not [f for f in os.listdir() if f.endswith(".tmp")]
+
 def test_remove_nonexistent_node_raises_error():
     m = ShardManager()
     m.add_node("NodeA")
@@ -94,6 +155,19 @@ def test_insert_multiple_records_same_id():
     
     assert len(res) == 2
 
+def test_lookups_see_writes_after_index_built():
+    m = ShardManager()
+    m.add_node("NodeA")
+
+    m.insert_data(["id1", "payload1", "2025-01-01"])
+    assert len(m.get_data("id1")) == 1
+
+    m.insert_data(["id1", "payload2", "2025-01-02"])
+    assert m.get_data("id1")['data'].tolist() == ["payload1", "payload2"]
+
+    m.delete_data("id1")
+    assert len(m.get_data("id1")) == 0
+
 def test_get_nonexistent_data():
     m = ShardManager()
     m.add_node("NodeA")
@@ -145,6 +219,24 @@ def test_hash_distribution():
     hashes = {m._hash(f"key{i}") for i in range(100)}
     assert len(hashes) > 90  # Should have mostly unique hashes
 
+def test_hash_many_matches_hash():
+    for max_limit in (2**32, 1000, 2**70):
+        m = ShardManager(max_limit=max_limit)
+        keys = [f"key{i}" for i in range(100)]
+
+        assert m._hash_many(keys).tolist() == [m._hash(k) for k in keys]
+
+def test_lookup_wraps_past_last_virtual_node():
+    m = ShardManager()
+    m.add_node("NodeA")
+    m.add_node("NodeB")
+
+    first = min(m.shards_to_idx, key=m.shards_to_idx.get)
+    last_hash = max(m.shards_to_idx.values())
+
+    assert m._find_node_for_hash(last_hash) == m.virtual_to_physical[first]
+    assert m._find_node_for_hash(m.max_limit - 1) == m.virtual_to_physical[first]
+
 def test_data_distributes_across_nodes():
     m = ShardManager()
     m.add_node("NodeA")
@@ -257,3 +349,435 @@ def test_consistent_mapping_after_rebalance():
         expected_node = m._find_node_for_hash(m._hash(k))
         stored_ids = set(read_ids_for_node(expected_node))
         assert k in stored_ids, f"{k} should be on {expected_node}"
+
+def test_buffered_inserts_flush_on_limit():
+    m = ShardManager(buffer_limit=3)
+    m.add_node("NodeA")
+
+    m.insert_data(["id1", "payload1", "2025-01-01"])
+    m.insert_data(["id2", "payload2", "2025-01-01"])
+    assert read_ids_for_node("NodeA") == []
+
+    m.insert_data(["id3", "payload3", "2025-01-01"])
+    assert read_ids_for_node("NodeA") == ["id1", "id2", "id3"]
+
+def test_buffered_inserts_visible_before_flush():
+    m = ShardManager(buffer_limit=100)
+    m.add_node("NodeA")
+
+    m.insert_data(["id1", "payload1", "2025-01-01"])
+    assert len(m.get_data("id1")) == 1
+
+    m.insert_data(["id2", "payload2", "2025-01-01"])
+    m.flush()
+    assert read_ids_for_node("NodeA") == ["id1", "id2"]
+
+def test_data_routable_after_node_removal():
+    m = ShardManager()
+    m.add_node("NodeA")
+    m.add_node("NodeB")
+    m.add_node("NodeC")
+
+    ids = [f"id{i}" for i in range(50)]
+    for k in ids:
+        m.insert_data([k, f"payload-{k}", "2025-01-01"])
+
+    m.remove_node("NodeB")
+
+    # Every key must live on the node the ring now maps it to
+    for k in ids:
+        assert len(m.get_data(k)) == 1, f"{k} not found on its mapped node"
+
+def test_cached_reads_match_disk():
+    m = ShardManager()
+    m.add_node("NodeA")
+
+    for i in range(10):
+        m.insert_data([f"id{i}", f"payload{i}", "2025-01-01"])
+    m.get_data("id0")
+    m.delete_data("id3")
+    m.insert_data(["id10", "payload10", "2025-01-01"])
+
+    cached = m.data_store.get_all("NodeA")
+    on_disk = pd.read_csv("NodeA.csv")
+    assert cached['id'].tolist() == on_disk['id'].tolist()
+    assert cached['data'].tolist() == on_disk['data'].tolist()
+
+def test_ids_round_trip_as_text():
+    m = ShardManager()
+    m.add_node("NodeA")
+    m.insert_data(["007", "payload", "2025-01-01"])
+
+    # A fresh store has nothing cached and must parse the file
+    res = DataStore().get_by_id("007", "NodeA")
+
+    assert res['id'].tolist() == ["007"]
+
+def test_route_cache_refreshed_on_membership_change():
+    m = ShardManager()
+    m.add_node("NodeA")
+
+    ids = [f"id{i}" for i in range(30)]
+    for k in ids:
+        m.insert_data([k, f"payload-{k}", "2025-01-01"])
+        m.get_data(k)
+
+    m.add_node("NodeB")
+    for k in ids:
+        assert len(m.get_data(k)) == 1
+
+    m.remove_node("NodeA")
+    for k in ids:
+        assert len(m.get_data(k)) == 1
+
+def test_unknown_algorithm_raises_error():
+    with pytest.raises(ValueError, match="Unknown algorithm"):
+        ShardManager(algorithm="modulo")
+
+def test_jump_hash_many_matches_jump_hash():
+    m = ShardManager()
+    hashes = m._hash_many([f"key{i}" for i in range(200)])
+
+    for n in (1, 2, 7, 64):
+        expected = [jump_hash(int(h), n) for h in hashes]
+        assert jump_hash_many(hashes, n).tolist() == expected
+        assert all(0 <= b < n for b in expected)
+
+def test_jump_rebalance_keeps_keys_routable():
+    m = ShardManager(algorithm="jump")
+    m.add_node("NodeA")
+    m.add_node("NodeB")
+    m.add_node("NodeC")
+
+    assert m.shards_to_idx == {}
+
+    ids = [f"id{i}" for i in range(60)]
+    for k in ids:
+        m.insert_data([k, f"payload-{k}", "2025-01-01"])
+
+    before = {k: m._find_node_for_hash(m._hash(k)) for k in ids}
+    m.add_node("NodeD")
+
+    # Adding a bucket only moves keys onto the new node
+    for k in ids:
+        node = m._find_node_for_hash(m._hash(k))
+        assert node in (before[k], "NodeD")
+
+    # Removing a node from the middle relocates the last bucket
+    m.remove_node("NodeB")
+
+    all_stored_ids = []
+    for node in m._nodes:
+        node_ids = read_ids_for_node(node)
+        all_stored_ids.extend(node_ids)
+        for k in node_ids:
+            assert m._find_node_for_hash(m._hash(k)) == node
+
+    assert sorted(all_stored_ids) == sorted(ids)
+
+def test_rendezvous_hash_many_matches_rendezvous_hash():
+    m = ShardManager()
+    hashes = m._hash_many([f"key{i}" for i in range(200)])
+    seeds = [m._hash(f"Node{i}") for i in range(5)]
+
+    expected = [rendezvous_hash(int(h), seeds) for h in hashes]
+    assert rendezvous_hash_many(hashes, np.array(seeds, dtype=np.uint64)).tolist() == expected
+    assert len(set(expected)) == len(seeds)
+
+def test_rendezvous_rebalance_only_moves_affected_keys():
+    m = ShardManager(algorithm="rendezvous")
+    m.add_node("NodeA")
+    m.add_node("NodeB")
+    m.add_node("NodeC")
+
+    ids = [f"id{i}" for i in range(60)]
+    for k in ids:
+        m.insert_data([k, f"payload-{k}", "2025-01-01"])
+
+    before = {k: m._find_node_for_hash(m._hash(k)) for k in ids}
+    m.remove_node("NodeB")
+
+    for k in ids:
+        node = m._find_node_for_hash(m._hash(k))
+        if before[k] != "NodeB":
+            assert node == before[k]
+        assert k in read_ids_for_node(node)
+
+def test_shared_ring_reader_follows_membership_changes():
+    m = ShardManager(share_ring=True)
+    reader = SharedRingReader(m.shared_ring.name)
+    try:
+        with pytest.raises(ValueError, match="No nodes available"):
+            reader.find_node_for_hash(0)
+
+        m.add_node("NodeA")
+        m.add_node("NodeB")
+        hashes = m._hash_many([f"key{i}" for i in range(100)])
+        expected = m._find_nodes_for_hashes(hashes).tolist()
+        assert reader.find_nodes_for_hashes(hashes).tolist() == expected
+        assert [reader.find_node_for_hash(int(h)) for h in hashes] == expected
+
+        m.add_node("NodeC")
+        m.remove_node("NodeA")
+        expected = m._find_nodes_for_hashes(hashes).tolist()
+        assert reader.find_nodes_for_hashes(hashes).tolist() == expected
+    finally:
+        reader.close()
+        m.close()
+
+def test_shared_ring_survives_reader_process_exit():
+    m = ShardManager(share_ring=True)
+    m.add_node("NodeA")
+    reader_script = (
+        "import sys\n"
+        "from consistent_hashing.manager.shared_ring import SharedRingReader\n"
+        "reader = SharedRingReader(sys.argv[1])\n"
+        "print(reader.find_node_for_hash(0))\n"
+    )
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(shared_ring.__file__)))
+    env = {**os.environ, "PYTHONPATH": package_root}
+    try:
+        for _ in range(2):
+            out = subprocess.run([sys.executable, "-c", reader_script, m.shared_ring.name],
+                                 capture_output=True, text=True, check=True, env=env)
+            assert out.stdout.strip() == "NodeA"
+        m.add_node("NodeB")
+        reader = SharedRingReader(m.shared_ring.name)
+        assert reader.find_node_for_hash(0) == m._find_node_for_hash(0)
+        reader.close()
+    finally:
+        m.close()
+
+def test_shared_ring_reader_gives_up_on_unfinished_publish(monkeypatch):
+    m = ShardManager(share_ring=True)
+    m.add_node("NodeA")
+    reader = SharedRingReader(m.shared_ring.name)
+    monkeypatch.setattr(shared_ring, "_REFRESH_TIMEOUT", 0.05)
+    try:
+        m.shared_ring._header[0] += 1
+        with pytest.raises(TimeoutError):
+            reader.find_node_for_hash(0)
+        m.shared_ring._header[0] += 1
+    finally:
+        reader.close()
+        m.close()
+
+def test_visualize_distribution_reports_physical_nodes(caplog):
+    m = ShardManager()
+    m.add_node("NodeA")
+    m.add_node("NodeB")
+    for i in range(10):
+        m.insert_data([f"id{i}", f"payload{i}", "2025-01-01"])
+
+    with caplog.at_level(logging.INFO):
+        m.visualize_distribution()
+
+    report = caplog.records[-1].getMessage()
+    counts = [int(line.split("count=")[1].split()[0]) for line in report.splitlines() if "count=" in line]
+    assert "#v" not in report
+    assert len(counts) == 2
+    assert sum(counts) == 10
+
+def test_parquet_nodes_round_trip():
+    pytest.importorskip("pyarrow")
+    m = ShardManager(buffer_limit=4, file_format="parquet")
+    m.add_node("NodeA")
+    m.add_node("NodeB")
+
+    ids = [f"id{i}" for i in range(30)]
+    for k in ids:
+        m.insert_data([k, f"payload-{k}", "2025-01-01"])
+    m.delete_data("id0")
+    m.add_node("NodeC")
+    m.remove_node("NodeA")
+    m.flush()
+
+    assert not os.path.exists("NodeA.parquet")
+    stored = []
+    for node in m._nodes:
+        df = pd.read_parquet(f"{node}.parquet")
+        stored.extend(df['id'].tolist())
+        for k in df['id']:
+            assert m._find_node_for_hash(m._hash(k)) == node
+
+    assert sorted(stored) == sorted(ids[1:])
+    assert m.get_data("id7")['data'].tolist() == ["payload-id7"]
+
+def test_row_writes_and_frame_writes_share_one_csv():
+    store = DataStore()
+    store.create_node("NodeRows")
+    store.get_all("NodeRows")
+    store.insert(["a", 'has, "quotes"', "2025-01-01"], "NodeRows")
+    store.insert_many(pd.DataFrame([["b", "", "2025-01-02"]], columns=["id", "data", "created_at"]), "NodeRows")
+    store.insert(["c", "plain", "2025-01-03"], "NodeRows")
+
+    cached = store.get_all("NodeRows")
+    on_disk = pd.read_csv("NodeRows.csv", dtype=str, keep_default_na=False)
+    assert cached['id'].tolist() == ["a", "b", "c"]
+    assert cached.values.tolist() == on_disk.values.tolist()
+    store.delete_node("NodeRows")
+
+def test_lookups_track_writes_without_flushing():
+    store = DataStore(buffer_limit=3)
+    store.create_node("NodeIdx")
+    store.insert(["a", "first", "2025-01-01"], "NodeIdx")
+    assert store.get_by_id("a", "NodeIdx")['data'].tolist() == ["first"]
+    assert store._buffers[store._get_node_config("NodeIdx")]
+
+    store.insert_many(pd.DataFrame([["b", "second", "2025-01-02"]], columns=["id", "data", "created_at"]), "NodeIdx")
+    store.insert(["a", "third", "2025-01-03"], "NodeIdx")
+    store.delete_by_id("b", "NodeIdx")
+    assert store.get_by_id("a", "NodeIdx")['data'].tolist() == ["first", "third"]
+    assert len(store.get_by_id("b", "NodeIdx")) == 0
+
+    store.flush("NodeIdx")
+    on_disk = pd.read_csv("NodeIdx.csv", dtype=str)
+    assert on_disk['data'].tolist() == ["first", "third"]
+    store.delete_node("NodeIdx")
+
+def test_opened_file_cache_evicts_least_recently_used(tmp_path):
+    cache = OpenedFileCache(capacity=2)
+    a = cache.get(str(tmp_path / "a.csv"))
+    b = cache.get(str(tmp_path / "b.csv"))
+    assert cache.get(str(tmp_path / "a.csv")) is a
+    cache.get(str(tmp_path / "c.csv"))
+
+    assert b.closed and not a.closed
+    assert list(cache) == [str(tmp_path / "a.csv"), str(tmp_path / "c.csv")]
+    cache.close_all()
+    assert a.closed and len(cache) == 0
+
+def test_evicted_handles_lose_no_rows():
+    store = DataStore(max_open_files=2)
+    nodes = [f"NodeLru{i}" for i in range(5)]
+    for node in nodes:
+        store.create_node(node)
+    for i in range(20):
+        store.insert([f"id{i}", f"payload{i}", "2025-01-01"], nodes[i % 5])
+    # Lock files count against the same limit as append handles.
+    assert len(store._handles) == 2
+    if os.path.isdir("/proc/self/fd"):
+        targets = []
+        for fd in os.listdir("/proc/self/fd"):
+            try:
+                targets.append(os.readlink(f"/proc/self/fd/{fd}"))
+            except FileNotFoundError:
+                pass
+        assert len([t for t in targets if "NodeLru" in t]) == 2
+
+    for n, node in enumerate(nodes):
+        assert pd.read_csv(f"{node}.csv", dtype=str)['id'].tolist() == [f"id{i}" for i in range(n, 20, 5)]
+    for node in nodes:
+        store.delete_node(node)
+
+def test_max_open_files_needs_room_for_a_lock_and_a_handle():
+    with pytest.raises(ValueError, match="at least 2"):
+        DataStore(max_open_files=1)
+
+def test_delete_keeps_rows_appended_by_another_writer():
+    a = DataStore()
+    b = DataStore()
+    a.create_node("NodeShared")
+    a.insert(["x", "from-a", "2025-01-01"], "NodeShared")
+    a.get_all("NodeShared")
+    b.insert(["y", "from-b", "2025-01-01"], "NodeShared")
+    a.delete_by_id("x", "NodeShared")
+
+    assert pd.read_csv("NodeShared.csv", dtype=str)['id'].tolist() == ["y"]
+    assert a.get_by_id("y", "NodeShared")['data'].tolist() == ["from-b"]
+
+    # b's append handle still points at the file a just replaced.
+    b.insert(["z", "from-b", "2025-01-02"], "NodeShared")
+    assert pd.read_csv("NodeShared.csv", dtype=str)['id'].tolist() == ["y", "z"]
+    a.delete_node("NodeShared")
+    b.close()
+
+def test_buffered_deletes_reapplied_over_another_writers_rows():
+    a = DataStore(buffer_limit=2)
+    b = DataStore()
+    a.create_node("NodeShared")
+    a.insert_many(pd.DataFrame([["x", "1", "d"], ["w", "2", "d"]], columns=["id", "data", "created_at"]), "NodeShared")
+    a.delete_by_id("x", "NodeShared")
+    b.insert(["y", "3", "d"], "NodeShared")
+    a.flush("NodeShared")
+
+    assert pd.read_csv("NodeShared.csv", dtype=str)['id'].tolist() == ["w", "y"]
+    a.delete_node("NodeShared")
+    b.close()
+
+def test_pending_deletes_survive_a_reread_after_another_writer():
+    a = DataStore(buffer_limit=3)
+    b = DataStore()
+    a.create_node("NodeShared")
+    a.insert_many(pd.DataFrame([["x", "1", "d"], ["w", "2", "d"], ["v", "3", "d"]], columns=["id", "data", "created_at"]),
+                  "NodeShared")
+    a.delete_by_id("x", "NodeShared")
+    b.insert(["y", "4", "d"], "NodeShared")
+    a.delete_by_id("w", "NodeShared")
+
+    assert len(a.get_by_id("x", "NodeShared")) == 0
+    assert a.get_all("NodeShared")['id'].tolist() == ["v", "y"]
+    a.flush("NodeShared")
+    assert pd.read_csv("NodeShared.csv", dtype=str)['id'].tolist() == ["v", "y"]
+    a.delete_node("NodeShared")
+    b.close()
+
+def test_reinserted_id_survives_compaction():
+    m = ShardManager(buffer_limit=3)
+    m.add_node("NodeA")
+    for row in (["id1", "old", "d"], ["x", "1", "d"], ["y", "2", "d"]):
+        m.insert_data(row)
+    m.delete_data("id1")
+    m.insert_data(["id1", "new", "d"])
+    m.flush()
+
+    assert read_ids_for_node("NodeA") == ["x", "y", "id1"]
+    assert m.get_data("id1")['data'].tolist() == ["new"]
+
+    # A reread from disk before compaction drops only the deleted row too.
+    m.delete_data("x")
+    m.insert_data(["x", "again", "d"])
+    m.data_store._drop_cache(m.data_store._get_node_config("NodeA"))
+    assert m.get_data("x")['data'].tolist() == ["again"]
+    m.flush()
+    assert read_ids_for_node("NodeA") == ["y", "id1", "x"]
+
+def test_staged_rows_flush_to_the_creating_directory(tmp_path, monkeypatch):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    monkeypatch.chdir(tmp_path / "a")
+    store = DataStore(buffer_limit=10)
+    store.create_node("NodeCwd")
+    store.insert(["id1", "payload1", "2025-01-01"], "NodeCwd")
+
+    monkeypatch.chdir(tmp_path / "b")
+    collected = weakref.ref(store)
+    del store
+    gc.collect()
+
+    assert collected() is None
+    assert not (tmp_path / "b" / "NodeCwd.csv").exists()
+    assert pd.read_csv(tmp_path / "a" / "NodeCwd.csv", dtype=str)['id'].tolist() == ["id1"]
+
+def test_multiline_values_read_back_by_a_fresh_store():
+    store = DataStore()
+    store.create_node("NodeLines")
+    rows = pd.DataFrame([[f"id{i}", f"line one\nline two {i}", "2025-01-01"] for i in range(50_000)],
+                        columns=["id", "data", "created_at"])
+    store.insert_many(rows, "NodeLines")
+    store.insert(["last", 'quoted "\nvalue"', "2025-01-02"], "NodeLines")
+
+    fresh = DataStore().get_all("NodeLines")
+    assert len(fresh) == 50_001
+    assert fresh['data'].iloc[123] == "line one\nline two 123"
+    assert fresh['data'].iloc[-1] == 'quoted "\nvalue"'
+    store.delete_node("NodeLines")
+
+def test_ring_without_virtual_nodes_reports_no_nodes():
+    m = ShardManager(virtual_nodes=0)
+    m.add_node("NodeA")
+
+    with pytest.raises(ValueError, match="No nodes available"):
+        m.insert_data(["id1", "payload1", "2025-01-01"])
+    with pytest.raises(ValueError, match="No nodes available"):
+        m._find_nodes_for_hashes(m._hash_many(["id1"]))
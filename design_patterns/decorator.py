@@ -1,6 +1,13 @@
 from abc import ABC, abstractmethod
 
 class Beverage(ABC):
+    __slots__ = ("_parts",)
+
+    def __init__(self, parts: tuple[str, ...] = ()) -> None:
+        # Description components; condiments extend their drink's tuple and
+        # join it once per call instead of concatenating at every level.
+        self._parts = parts or (self.get_description(),)
+
     @abstractmethod
     def get_description(self) -> str:
         pass
@@ -10,18 +17,29 @@ class Beverage(ABC):
         pass
 
 class CondimentDecorator(Beverage):
-    def __init__(self, beverage: Beverage) -> None:
+    __slots__ = ("_beverage", "_cost")
+
+    def __init__(self, beverage: Beverage, name: str, cost: float) -> None:
         self._beverage = beverage
+        # The wrapped drink never changes, so its cost is added up once here
+        # instead of walking the whole chain on every get_cost().
+        self._cost = beverage.get_cost() + cost
+        super().__init__(beverage._parts + (name,))
 
-    @abstractmethod
     def get_description(self) -> str:
-        pass
+        return ", ".join(self._parts)
+
+    def get_cost(self) -> float:
+        return self._cost
 
 # Beverage Implementations
 class Espresso(Beverage):
+    __slots__ = ("description", "cost")
+
     def __init__(self) -> None:
         self.description = "Espresso"
         self.cost = 4.0
+        super().__init__()
 
     def get_description(self) -> str:
         return self.description
@@ -31,9 +49,12 @@ class Espresso(Beverage):
 
 
 class HouseBlend(Beverage):
+    __slots__ = ("description", "cost")
+
     def __init__(self) -> None:
         self.description = "House Blend"
         self.cost = 5.0
+        super().__init__()
 
     def get_description(self) -> str:
         return self.description
@@ -44,25 +65,17 @@ class HouseBlend(Beverage):
 
 # Condiments
 class Mocha(CondimentDecorator):
-    def __init__(self, beverage: Beverage) -> None:
-        super().__init__(beverage)
-
-    def get_description(self) -> str:
-        return self._beverage.get_description() + ", Mocha"
+    __slots__ = ()
 
-    def get_cost(self) -> float:
-        return self._beverage.get_cost() + 1.0
+    def __init__(self, beverage: Beverage) -> None:
+        super().__init__(beverage, "Mocha", 1.0)
 
 
 class Whip(CondimentDecorator):
-    def __init__(self, beverage: Beverage) -> None:
-        super().__init__(beverage)
-
-    def get_description(self) -> str:
-        return self._beverage.get_description() + ", Whip"
+    __slots__ = ()
 
-    def get_cost(self) -> float:
-        return self._beverage.get_cost() + 2.0
+    def __init__(self, beverage: Beverage) -> None:
+        super().__init__(beverage, "Whip", 2.0)
 
 
 espresso = Espresso()
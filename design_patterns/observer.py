@@ -32,35 +32,16 @@ class LoggingDisplay(Display):
             print(key.title(), ": ", value)
 
 
-class SubscriberA(Observer, LoggingDisplay):
-    def __init__(self, subject: Observable) -> None:
+class PrefixedSubscriber(Observer, LoggingDisplay):
+    def __init__(self, subject: Observable, prefix: str) -> None:
         self.subject = subject
+        self.prefix = prefix
         self.data = {}
         subject.attach(self)
 
     def update(self, data: dict[str, str]):
-        for key, value in data.items():
-            data[key] = f"A: {value}"
-
-        self.data = data
-        self.display(data=data)
-
-    def detach(self):
-        self.subject.detach(self)
-
-
-class SubscriberB(Observer, LoggingDisplay):
-    def __init__(self, subject: Observable) -> None:
-        self.subject = subject
-        self.data = {}
-        subject.attach(self)
-
-    def update(self, data: dict[str, str]):
-        for key, value in data.items():
-            data[key] = f"B: {value}"
-
-        self.data = data
-        self.display(data=data)
+        self.data = {key: f"{self.prefix}: {value}" for key, value in data.items()}
+        self.display(data=self.data)
 
     def detach(self):
         self.subject.detach(self)
@@ -68,20 +49,24 @@ class SubscriberB(Observer, LoggingDisplay):
 
 class PublisherA(Observable):
     def __init__(self) -> None:
-        self.subscribers: list[Observer] = []
+        # Replaced rather than mutated, so notify() iterates a snapshot and
+        # a subscriber may detach itself from inside update().
+        self.subscribers: tuple[Observer, ...] = ()
         self.value: int = 0
         
     def attach(self, observer: Observer):
-        self.subscribers.append(observer)
+        self.subscribers = self.subscribers + (observer,)
 
     def detach(self, observer: Observer):
-        self.subscribers.remove(observer)
+        subscribers = list(self.subscribers)
+        subscribers.remove(observer)
+        self.subscribers = tuple(subscribers)
 
     def notify(self):
+        # Subscribers build their own copies, so one dict serves them all.
+        data = {"value": str(self.value)}
         for sub in self.subscribers:
-            sub.update(data={
-                "value": str(self.value)
-            })
+            sub.update(data=data)
         print("-----")
 
     def update(self, value):
@@ -90,8 +75,8 @@ class PublisherA(Observable):
 
 
 publisher = PublisherA()
-subscribera = SubscriberA(publisher)
-subscriberb = SubscriberB(publisher)
+subscribera = PrefixedSubscriber(publisher, "A")
+subscriberb = PrefixedSubscriber(publisher, "B")
 publisher.update(10)
 publisher.update(20)
 subscribera.detach()
@@ -24,13 +24,15 @@ class GZipCompressionStrategy(CompressionStrategy):
 
 class Compressor:
     def __init__(self, strategy: CompressionStrategy):
-        self._strategy = strategy
+        self.set_strategy(strategy)
 
     def set_strategy(self, strategy: CompressionStrategy):
         self._strategy = strategy
+        # Bound once per strategy change rather than looked up per call.
+        self._compress = strategy.compress
 
     def compress_data(self, data) -> str:
-        return self._strategy.compress(data)
+        return self._compress(data)
     
 
 data = "Example data to be compressed"
@@ -1,10 +1,60 @@
+import math
+
+try:
+    # numba needs numpy, so both are only required for the native path.
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = njit = None
+
+_INT64_MIN, _INT64_MAX = -(1 << 63), (1 << 63) - 1
+
+
+def _kth_int64(A, B, k):
+    # Same search as Solution.kthElement over int64 arrays, with the int64
+    # limits standing in for the infinities so numba can type the loop.
+    if len(B) < len(A):
+        A, B = B, A
+    n, m = len(A), len(B)
+    neg, pos = _INT64_MIN, _INT64_MAX
+    low = max(0, k - m) - 1
+    high = min(k, n) - 1
+    while low <= high:
+        midA = (low + high) // 2
+        midB = k - midA - 2
+        Aleft = A[midA] if midA >= 0 else neg
+        Aright = A[midA + 1] if midA + 1 < n else pos
+        Bleft = B[midB] if midB >= 0 else neg
+        Bright = B[midB + 1] if midB + 1 < m else pos
+        if Aleft <= Bright and Bleft <= Aright:
+            return max(Aleft, Bleft)
+        elif Aleft > Bright:
+            high = midA - 1
+        else:
+            low = midA + 1
+    return -1
+
+
+_kth_int64_native = njit(cache=True)(_kth_int64) if njit is not None else None
+# Below this the first call's compile (or cache load) outweighs the loop.
+_NATIVE_MIN_SIZE = 1024
+
+
 class Solution:
     def kthElement(self, a, b, k):
+        if (_kth_int64_native is not None and isinstance(a, np.ndarray) and isinstance(b, np.ndarray)
+                and a.dtype.kind == "i" and b.dtype.kind == "i" and len(a) + len(b) > _NATIVE_MIN_SIZE):
+            return _kth_int64_native(a.astype(np.int64, copy=False), b.astype(np.int64, copy=False), k)
+
         A, B = a, b
         if len(b) < len(a):
             A, B = B, A
             
         n, m = len(A), len(B)
+        # Locals keep the loop on fast local loads instead of re-resolving
+        # len() and building the infinities each iteration.
+        neg, pos = -math.inf, math.inf
+        a_at, b_at = A.__getitem__, B.__getitem__
         low = max(0, k - m) - 1  # -1 means take 0 elements from A
         high = min(k, n) - 1
 
@@ -12,10 +62,10 @@ class Solution:
             midA = (low + high) // 2
             midB = k - midA - 2
             
-            Aleft = A[midA] if midA >= 0 else float("-inf")
-            Aright = A[midA + 1] if midA + 1 < len(A) else float("inf")
-            Bleft = B[midB] if midB >= 0 else float("-inf")
-            Bright = B[midB + 1] if midB + 1 < len(B) else float("inf")
+            Aleft = a_at(midA) if midA >= 0 else neg
+            Aright = a_at(midA + 1) if midA + 1 < n else pos
+            Bleft = b_at(midB) if midB >= 0 else neg
+            Bright = b_at(midB + 1) if midB + 1 < m else pos
             
             if (Aleft <= Bright and Bleft <= Aright):
                 return max(Aleft, Bleft)
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+import main
+from main import Solution
+
+
+def random_sorted_pairs(seed, count=500):
+    rng = random.Random(seed)
+    for _ in range(count):
+        a = sorted(rng.randint(-50, 50) for _ in range(rng.randint(0, 12)))
+        b = sorted(rng.randint(-50, 50) for _ in range(rng.randint(0, 12)))
+        if a or b:
+            yield a, b, rng.randint(1, len(a) + len(b))
+
+def test_kth_element_matches_sorted_merge():
+    for a, b, k in random_sorted_pairs(1):
+        assert Solution().kthElement(a, b, k) == sorted(a + b)[k - 1]
+
+def test_int64_kernel_matches_sorted_merge():
+    for a, b, k in random_sorted_pairs(2):
+        assert main._kth_int64(a, b, k) == sorted(a + b)[k - 1]
+
+def test_int64_kernel_handles_int64_limits():
+    a = [main._INT64_MIN, 0]
+    b = [main._INT64_MAX]
+    for k in range(1, 4):
+        assert main._kth_int64(a, b, k) == sorted(a + b)[k - 1]
+
+def test_native_kernel_dispatch_matches_sorted_merge():
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("numba")
+    rng = np.random.default_rng(3)
+    a = np.sort(rng.integers(-10**12, 10**12, 3000))
+    b = np.sort(rng.integers(-10**12, 10**12, 2000))
+    merged = np.sort(np.concatenate([a, b]))
+    for k in (1, 17, 2500, 5000):
+        assert Solution().kthElement(a, b, k) == merged[k - 1]
+        assert main._kth_int64_native(a, b, k) == merged[k - 1]